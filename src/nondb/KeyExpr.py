@@ -0,0 +1,150 @@
+import re
+from collections.abc import Callable
+from functools import lru_cache
+from operator import attrgetter
+from types import NoneType, UnionType
+from typing import Any, Union, get_args, get_origin
+from weakref import WeakKeyDictionary
+
+import jmespath
+from jmespath.parser import ParsedResult
+from pydantic import BaseModel, PlainSerializer, WrapSerializer
+from pydantic.fields import FieldInfo
+
+_SIMPLE_PATH = re.compile(r"[A-Za-z_]\w*(\.[A-Za-z_]\w*)*")
+
+# Leaf types whose model_dump() value is the attribute value itself
+_PLAIN_TYPES = (str, int, float, bool)
+
+# Model config options that rewrite string values during validation
+_STR_TRANSFORMS = ("str_strip_whitespace", "str_to_lower", "str_to_upper")
+
+# Key getters per schema and expression; entries go away with their schema class
+_key_getters: WeakKeyDictionary[
+    type[BaseModel], dict[str, Callable[[BaseModel], Any]]
+] = WeakKeyDictionary()
+
+
+@lru_cache(maxsize=None)
+def compile_expr(expr: str) -> ParsedResult:
+    """Compile a JMESPath expression, reusing previously compiled expressions."""
+    return jmespath.compile(expr)
+
+
+def _model_path(
+    schema: type[BaseModel], expr: str
+) -> list[tuple[type[BaseModel], str, FieldInfo]] | None:
+    """Resolve a dotted path to the declared model fields it walks, if it can."""
+    if not _SIMPLE_PATH.fullmatch(expr):
+        return None
+    path = []
+    model: Any = schema
+    for name in expr.split("."):
+        if not (isinstance(model, type) and issubclass(model, BaseModel)):
+            return None
+        field = model.model_fields.get(name)
+        if field is None or field.exclude:
+            return None
+        path.append((model, name, field))
+        model = field.annotation
+    return path
+
+
+def _has_custom_json(model: type[BaseModel], name: str, field: FieldInfo) -> bool:
+    """Check whether a field's JSON key or value may differ from the attribute."""
+    decorators = model.__pydantic_decorators__
+    if decorators.model_serializers or field.alias or field.serialization_alias:
+        return True
+    if any(isinstance(m, (PlainSerializer, WrapSerializer)) for m in field.metadata):
+        return True
+    return any(
+        name in serializer.info.fields or "*" in serializer.info.fields
+        for serializer in decorators.field_serializers.values()
+    )
+
+
+def _validates_as_is(model: type[BaseModel], name: str, field: FieldInfo) -> bool:
+    """Check whether validation keeps a well-typed JSON value for a field unchanged."""
+    decorators = model.__pydantic_decorators__
+    config = model.model_config
+    if field.metadata or decorators.model_validators:
+        return False
+    if any(config.get(key) for key in _STR_TRANSFORMS):
+        return False
+    return not any(
+        name in validator.info.fields or "*" in validator.info.fields
+        for validator in decorators.field_validators.values()
+    )
+
+
+def _is_plain(annotation: Any) -> bool:
+    """Check whether a field type is a plain scalar, optionally None."""
+    if get_origin(annotation) in (Union, UnionType):
+        return all(arg is NoneType or _is_plain(arg) for arg in get_args(annotation))
+    return annotation in _PLAIN_TYPES
+
+
+def _plain_path(
+    schema: type[BaseModel], expr: str
+) -> list[tuple[type[BaseModel], str, FieldInfo]] | None:
+    """Resolve a path whose attribute value matches what model_dump() produces."""
+    path = _model_path(schema, expr)
+    if path is None or not _is_plain(path[-1][2].annotation):
+        return None
+    if any(_has_custom_json(model, name, field) for model, name, field in path):
+        return None
+    return path
+
+
+def key_getter(schema: type[BaseModel], expr: str) -> Callable[[BaseModel], Any]:
+    """Get a function that evaluates the expression against a record.
+
+    Dotted paths over declared model fields ending in a plain scalar, with no
+    custom serialization on the way, are read straight off the record with
+    attrgetter; anything else is searched on the record's model_dump().
+    Getters are shared by every table and index using the same schema and
+    expression.
+    """
+    getters = _key_getters.setdefault(schema, {})
+    getter = getters.get(expr)
+    if getter is None:
+        getter = getters[expr] = _build_key_getter(schema, expr)
+    return getter
+
+
+def needs_dump(schema: type[BaseModel], expr: str) -> bool:
+    """Check whether evaluating the expression requires the record's model_dump()."""
+    return _plain_path(schema, expr) is None
+
+
+def _build_key_getter(schema: type[BaseModel], expr: str) -> Callable[[BaseModel], Any]:
+    if not needs_dump(schema, expr):
+        return attrgetter(expr)
+    search = compile_expr(expr).search
+    return lambda record: search(record.model_dump())
+
+
+def raw_key_getter(schema: type[BaseModel], expr: str) -> Callable[[Any], Any] | None:
+    """Build a function that evaluates the expression against a record's parsed JSON.
+
+    Only available when the path ends in a plain str, int or bool field whose
+    JSON form matches the attribute value; returns None otherwise. The getter
+    raises TypeError for a value of any other type, such as 5.0 for an int
+    field, which validation would coerce.
+    """
+    path = _plain_path(schema, expr)
+    if path is None or path[-1][2].annotation not in (str, int, bool):
+        return None
+    if not all(_validates_as_is(model, name, field) for model, name, field in path):
+        return None
+    names = [name for _, name, _ in path]
+    leaf_type = path[-1][2].annotation
+
+    def get(data: Any) -> Any:
+        for name in names:
+            data = data[name]
+        if type(data) is not leaf_type:
+            raise TypeError(f"expected {leaf_type.__name__}, got {data!r}")
+        return data
+
+    return get
@@ -14,7 +14,7 @@ class NonDB:
     def table(self, schema: type[BaseModel], key_expr: str = "id") -> NonTable:
         """Get or create a table for the given schema."""
         table_name = schema.__name__
-        if table_name not in self.tables.keys():
+        if table_name not in self.tables:
             self.tables[table_name] = NonTable(self.storage, schema, key_expr)
         return self.tables[table_name]
 
@@ -1,13 +1,23 @@
 import os
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from collections.abc import Iterable, Iterator
 from shutil import rmtree
+from typing import Any
 
-import jmespath
 from pydantic import BaseModel
+from pydantic_core import from_json
 
+from .KeyExpr import compile_expr, key_getter, needs_dump, raw_key_getter
 from .Storage import Storage
 
 
+def _is_empty_dir(path: str) -> bool:
+    """Check whether a directory has no entries, reading at most one of them."""
+    with os.scandir(path) as entries:
+        return next(entries, None) is None
+
+
 class IIndexed[T](ABC):
     @abstractmethod
     def key_for(self, record: T) -> str: ...
@@ -21,7 +31,10 @@ class IIndexed[T](ABC):
     def storage(self) -> Storage: ...
 
     @abstractmethod
-    def all(self) -> list[T]: ...
+    def iter_all(self) -> Iterator[T]: ...
+
+    @abstractmethod
+    def fetch(self, key: str) -> T: ...
 
 
 class NonIndex[T: BaseModel]:
@@ -29,80 +42,188 @@ class NonIndex[T: BaseModel]:
         self.table = table
         self.schema = schema
         self.storage = table.storage.add_child(f"_index@{index_expr}")
-        self.index_expr = jmespath.compile(index_expr)
+        self.index_expr = compile_expr(index_expr)
+        self._key_fn = key_getter(schema, index_expr)
+        self._needs_dump = needs_dump(schema, index_expr)
+        self._raw_key_fn = raw_key_getter(schema, index_expr)
+        if not schema.__pydantic_complete__:
+            schema.model_rebuild()
+        self._validate = schema.__pydantic_validator__.validate_json
+        self._reverse: dict[str, str] | None = None  # primary key -> index key
 
     # internal symlink management methods
 
     def _link(self, index_key: str, primary_key: str) -> None:
-        index_key_storage = self.storage.add_child(str(index_key))
         os.symlink(
-            self.table.storage.path / f"{primary_key}.json",
-            index_key_storage.path / f"{primary_key}.json",
+            self.table.storage.path_for(primary_key),
+            self.storage.add_child(index_key).path_for(primary_key),
         )
 
-    def _unlink(self, index_key: str, primary_key: str) -> None:
-        index_key_storage = self.storage.add_child(str(index_key))
-        symlink_path = index_key_storage.path / f"{primary_key}.json"
-        if symlink_path.exists() and symlink_path.is_symlink():
-            symlink_path.unlink()
-            # If the index key directory is empty after removing the symlink, remove it
-            if not any(index_key_storage.path.iterdir()):
-                index_key_storage.path.rmdir()
+    def _unlink(self, index_key: str, primary_key: str) -> bool:
+        index_key_path = os.path.join(self.storage.path, index_key)
+        try:
+            # Unlink without resolving the target, so dangling links go too
+            os.unlink(os.path.join(index_key_path, f"{primary_key}.json"))
+        except FileNotFoundError:
+            return False
+        # If the index key directory is empty after removing the symlink, remove it
+        if _is_empty_dir(index_key_path):
+            self._remove_key_dir(index_key)
+        return True
 
     def _unlinkAll(self, primary_key: str) -> None:
         """Remove all symlinks for the given primary key across all index keys."""
-        for index_key_dir in self.storage.path.iterdir():
-            if index_key_dir.is_dir():
-                self._unlink(index_key_dir.name, primary_key)
+        for index_key in self._index_keys():
+            self._unlink(index_key, primary_key)
+
+    def _remove_key_dir(self, index_key: str) -> None:
+        """Remove an empty index key directory and forget its cached storage."""
+        os.rmdir(os.path.join(self.storage.path, index_key))
+        self.storage.children.pop(index_key, None)
+
+    def _index_keys(self) -> list[str]:
+        """List the index keys that currently have a directory."""
+        try:
+            entries = os.scandir(self.storage.path)
+        except FileNotFoundError:
+            return []
+        with entries:
+            return [entry.name for entry in entries if entry.is_dir()]
+
+    def _reverse_map(self) -> dict[str, str]:
+        """Map each indexed primary key to its index key, scanning the index once."""
+        if self._reverse is None:
+            reverse: dict[str, str] = {}
+            for index_key in self._index_keys():
+                for primary_key in self.keys(index_key):
+                    reverse[primary_key] = index_key
+            self._reverse = reverse
+        return self._reverse
 
     # record management methods
 
     def key_for(self, record: T) -> str:
         """Get the index key for the given record."""
-        return self.index_expr.search(record.model_dump())
+        return self._key_fn(record)
 
     def put(self, record: T) -> None:
         """Update the index for the given record."""
-        primary_key = self.table.key_for(record)
-        self._unlinkAll(primary_key)  # Clean up existing symlinks
-        index_key = self.key_for(record)
+        self.put_many((record,))
+
+    def put_many(self, records: Iterable[T]) -> None:
+        """Update the index for each of the given records."""
+        primary_key_for = self.table.key_for
+        for record in records:
+            self.put_key(str(primary_key_for(record)), record)
+
+    def put_key(
+        self, primary_key: str, record: T, dumped: dict[str, Any] | None = None
+    ) -> dict[str, Any] | None:
+        """Update the index for a record whose primary key is already known.
+
+        If the index expression needs the record's model_dump(), a dump passed
+        in as dumped is used instead of making a new one. The dump used, if
+        any, is returned so that it can be passed on to the next index.
+        """
+        if self._needs_dump:
+            if dumped is None:
+                dumped = record.model_dump()
+            index_key = self.index_expr.search(dumped)
+        else:
+            index_key = self._key_fn(record)
+        self._put_key(str(index_key), primary_key)
+        return dumped
+
+    def _put_key(self, index_key: str, primary_key: str) -> None:
+        """Link a primary key under an index key, moving it from any previous key."""
+        link_path = os.path.join(self.storage.path, index_key, f"{primary_key}.json")
+        if os.path.islink(link_path):
+            return  # Already indexed under this key
+        reverse = self._reverse_map()
+        old_index_key = reverse.get(primary_key)
+        # Another handle may have moved the link since the map was built; if it
+        # is not where the map says, look for it under every index key
+        if old_index_key is None or not self._unlink(old_index_key, primary_key):
+            self._unlinkAll(primary_key)
         self._link(index_key, primary_key)
+        reverse[primary_key] = index_key
+
+    def keys(self, index_key: str) -> list[str]:
+        """Get the primary keys of records matching the given index key."""
+        try:
+            entries = os.scandir(os.path.join(self.storage.path, str(index_key)))
+        except FileNotFoundError:
+            return []
+        with entries:
+            return [
+                entry.name.removesuffix(".json")
+                for entry in entries
+                if entry.name.endswith(".json")
+            ]
 
     def get(self, index_key: str) -> list[T]:
         """Get records matching the given index key."""
-        items = []
-        for item in (self.storage.path / str(index_key)).glob("*.json"):
-            with open(item) as f:
-                items.append(self.schema.model_validate_json(f.read()))
-        return items
+        # Go through the table so repeated lookups are served from its fetch cache
+        return [self.table.fetch(key) for key in self.keys(index_key)]
 
     def delete(self, record: T) -> None:
         """Remove the given record from the index."""
-        primary_key = self.table.key_for(record)
-        index_key = self.key_for(record)
-        self._unlink(index_key, primary_key)
+        primary_key = str(self.table.key_for(record))
+        index_key = self._reverse_map().pop(primary_key, str(self.key_for(record)))
+        if not self._unlink(index_key, primary_key):
+            self._unlinkAll(primary_key)
+
+    def _scan_keys(self) -> Iterator[tuple[Any, str]]:
+        """Yield the index key and primary key of every record in the table."""
+        if self._raw_key_fn is None:
+            for record in self.table.iter_all():
+                yield self.key_for(record), str(self.table.key_for(record))
+            return
+        # The index field's JSON form matches the model, so skip validation and
+        # take the primary key from the file name
+        for primary_key, data in self.table.storage.items():
+            try:
+                index_key = self._raw_key_fn(from_json(data))
+            except (KeyError, TypeError):  # e.g. a field filled in by a default
+                index_key = self.key_for(self._validate(data))
+            yield index_key, primary_key
 
     # index management utilities
 
     def remove_index(self) -> None:
         """Remove the entire index."""
-        if self.storage.path.exists():
+        try:
             rmtree(self.storage.path)
+        except FileNotFoundError:
+            pass
+        self.storage.children.clear()
+        self._reverse = None
 
     def rebuild_index(self) -> None:
         """Rebuild the index from the table."""
         self.remove_index()
         Storage.ensure_dir(self.storage.path)
-        for record in self.table.all():
-            self.put(record)
+        groups: dict[str, list[str]] = defaultdict(list)
+        for index_key, primary_key in self._scan_keys():
+            groups[str(index_key)].append(primary_key)
+        reverse: dict[str, str] = {}
+        target_for = self.table.storage.path_for
+        for index_key, primary_keys in groups.items():
+            link_for = self.storage.add_child(index_key).path_for
+            for primary_key in primary_keys:
+                os.symlink(target_for(primary_key), link_for(primary_key))
+                reverse[primary_key] = index_key
+        self._reverse = reverse
 
     def vacuum_index(self) -> None:
         """Remove broken symlinks and empty directories."""
-        for index_key_dir in self.storage.path.iterdir():
-            if index_key_dir.is_dir():
-                for symlink in index_key_dir.iterdir():
-                    if symlink.is_symlink() and not symlink.exists():
-                        symlink.unlink()
-                # If the directory is empty after removing broken symlinks, remove it
-                if not any(index_key_dir.iterdir()):
-                    index_key_dir.rmdir()
+        for index_key in self._index_keys():
+            index_key_path = os.path.join(self.storage.path, index_key)
+            with os.scandir(index_key_path) as entries:
+                for entry in entries:
+                    if entry.is_symlink() and not os.path.exists(entry.path):
+                        os.unlink(entry.path)
+            # If the directory is empty after removing broken symlinks, remove it
+            if _is_empty_dir(index_key_path):
+                self._remove_key_dir(index_key)
+        self._reverse = None
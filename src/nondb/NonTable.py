@@ -1,16 +1,32 @@
-import jmespath
+from collections import OrderedDict
+from collections.abc import Iterable, Iterator
+from functools import cached_property
+
 from pydantic import BaseModel
 
+from .KeyExpr import compile_expr, key_getter
 from .NonIndex import IIndexed, NonIndex
 from .Storage import Storage
 
 
 class NonTable[T: BaseModel](IIndexed[T]):
+    cache_size = 4096  # documents kept by fetch, least recently used first out
+
     def __init__(self, db_storage: Storage, schema: type[T], key_expr: str):
         self.db_storage = db_storage
         self._schema = schema
-        self._jmespath = jmespath.compile(key_expr)
+        self._jmespath = compile_expr(key_expr)
+        self._key_fn = key_getter(schema, key_expr)
+        if not schema.__pydantic_complete__:
+            schema.model_rebuild()
+        # Bound pydantic-core entry points, skipping the classmethod wrappers per call
+        self._validate = schema.__pydantic_validator__.validate_json
+        self._dump = schema.__pydantic_serializer__.to_json
         self._indices: dict[str, NonIndex] = {}
+        # Raw documents keyed by path, with the stat signature they were read at
+        self._cache: OrderedDict[str, tuple[tuple[int, int, int], bytes]] = (
+            OrderedDict()
+        )
 
     @property
     def schema(self) -> type[T]:
@@ -22,32 +38,81 @@ class NonTable[T: BaseModel](IIndexed[T]):
 
     @key_expr.setter
     def _key_expr(self, expr: str) -> None:
-        self._jmespath = jmespath.compile(expr)
+        self._jmespath = compile_expr(expr)
+        self._key_fn = key_getter(self.schema, expr)
 
-    @property
+    @cached_property
     def storage(self) -> Storage:
         return self.db_storage.add_child(self.schema.__name__)
 
     def key_for(self, record: T) -> str:
-        return self._jmespath.search(record.model_dump())
+        return self._key_fn(record)
 
     def fetch(self, key: str) -> T:
-        return self.schema.model_validate_json(self.storage.read(key))
+        key = str(key)
+        path = self.storage.path_for(key)
+        st = self.storage.stat(key)
+        signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+        cached = self._cache.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, self.storage.read(key))
+            self._cache[path] = cached
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self._cache.move_to_end(path)
+        # Parse a fresh record every time so callers never share mutable state;
+        # validating the cached bytes is much cheaper than a deep copy
+        return self._validate(cached[1])
+
+    def iter_all(self, workers: int = 0) -> Iterator[T]:
+        if workers:
+            # Reads overlap on a thread pool; parsing holds the GIL
+            for item in self.storage.all_parallel(workers):
+                yield self._validate(item)
+            return
+        # Go through fetch so unchanged records are served from its cache
+        for key in self.keys():
+            yield self.fetch(key)
 
-    def all(self) -> list[T]:
-        return [self.schema.model_validate_json(item) for item in self.storage.all()]
+    def all(self, workers: int = 0) -> list[T]:
+        return list(self.iter_all(workers))
 
     def keys(self) -> list[str]:
-        return [file.stem for file in self.storage.names()]
+        suffix = f".{self.storage.file_ext}"
+        return [name.removesuffix(suffix) for name in self.storage.names()]
 
     def save(self, record: T) -> None:
-        key = self.key_for(record)
-        self.storage.write(str(key), record.model_dump_json())
-        for index in self._indices.values():
-            index.put(record)
+        key = str(self._key_fn(record))
+        self._cache.pop(self.storage.path_for(key), None)
+        self.storage.write(key, self._dump(record))
+        self._update_indices(((key, record),))
+
+    def save_many(self, records: Iterable[T]) -> None:
+        records = list(records)
+        # Serialize everything up front, then write and index in tight loops
+        key_fn, dump = self._key_fn, self._dump
+        payloads = [(str(key_fn(record)), dump(record)) for record in records]
+        for key, data in payloads:
+            self._cache.pop(self.storage.path_for(key), None)
+            self.storage.write(key, data)
+        self._update_indices(
+            (key, record) for (key, _), record in zip(payloads, records)
+        )
+
+    def _update_indices(self, keyed_records: Iterable[tuple[str, T]]) -> None:
+        """Update every index in one pass, dumping each record at most once."""
+        indices = list(self._indices.values())
+        if not indices:
+            return
+        for key, record in keyed_records:
+            dumped = None
+            for index in indices:
+                dumped = index.put_key(key, record, dumped)
 
     def delete(self, record: T) -> None:
-        self.storage.delete(self.key_for(record))
+        key = str(self._key_fn(record))
+        self._cache.pop(self.storage.path_for(key), None)
+        self.storage.delete(key)
         for index in self._indices.values():
             index.delete(record)
 
@@ -1,76 +1,296 @@
-from functools import lru_cache
+import os
+import stat
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache, partial
 from pathlib import Path
 from shutil import rmtree
 
 
+def _with_suffix(suffix: str, name: str) -> str:
+    """Append the suffix to the name unless it is already there."""
+    return name if name.endswith(suffix) else name + suffix
+
+
 def cn(name: str, file_ext: str) -> str:
     """Construct a canonical name with the given file extension."""
-    name = str(name)
-    if name.endswith(f".{file_ext}"):
-        return name
-    return f"{name}.{file_ext}"
+    return _with_suffix(f".{file_ext}", str(name))
+
+
+# Reads are I/O bound, so oversubscribe the CPUs
+DEFAULT_READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Whether documents can be opened relative to a directory descriptor; os.replace
+# is never listed in supports_dir_fd, but os.rename is and overwrites on POSIX
+_DIR_FD_SUPPORTED = {os.open, os.stat, os.unlink, os.rename} <= os.supports_dir_fd
+
+
+def read_file(path: str, dir_fd: int | None = None) -> bytes:
+    """Read the raw contents of a file into a single sized buffer."""
+    fd = os.open(path, os.O_RDONLY, dir_fd=dir_fd)
+    try:
+        size = os.fstat(fd).st_size
+        # Ask for one byte more than the file size so EOF is seen in one read
+        data = os.read(fd, size + 1)
+        if len(data) > size:  # the file grew after fstat; read the rest
+            chunks = [data]
+            while chunk := os.read(fd, 1 << 16):
+                chunks.append(chunk)
+            data = b"".join(chunks)
+        return data
+    finally:
+        os.close(fd)
+
+
+def write_file(path: str, data: bytes, dir_fd: int | None = None) -> None:
+    """Atomically replace the contents of a file.
+
+    The data is written to a temporary file next to the target, which is then
+    renamed over it, so readers never see a partially written file.
+    """
+    tmp_path = f"{path}.{os.urandom(4).hex()}.tmp"
+    flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL
+    fd = os.open(tmp_path, flags, 0o666, dir_fd=dir_fd)
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(fd, view) :]
+        finally:
+            os.close(fd)
+        if dir_fd is None:
+            os.replace(tmp_path, path)
+        else:
+            os.rename(tmp_path, path, src_dir_fd=dir_fd, dst_dir_fd=dir_fd)
+    except BaseException:
+        os.unlink(tmp_path, dir_fd=dir_fd)
+        raise
+
+
+def sync_files(paths: Iterable[str]) -> None:
+    """Flush files to disk, then each of their directories once."""
+    dirs = set()
+    for path in paths:
+        dirs.add(os.path.dirname(path))
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except FileNotFoundError:
+            continue  # deleted; syncing its directory records that
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    for path in dirs:
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+@lru_cache(maxsize=None)
+def _read_pool() -> ThreadPoolExecutor:
+    """Get the thread pool shared by all parallel reads, creating it on first use."""
+    return ThreadPoolExecutor(DEFAULT_READ_WORKERS, thread_name_prefix="nondb-read")
+
+
+def _map_bounded[A, R](
+    fn: Callable[[A], R], items: Iterable[A], limit: int
+) -> Iterator[R]:
+    """Map fn over items on the shared read pool, with at most limit calls in flight."""
+    pool = _read_pool()
+    pending: deque[Future[R]] = deque()
+    for item in items:
+        if len(pending) >= limit:
+            yield pending.popleft().result()
+        pending.append(pool.submit(fn, item))
+    while pending:
+        yield pending.popleft().result()
 
 
 class Storage:
     """A simple file-based storage system."""
 
+    _dirfd: int | None = None  # opened lazily by _at
+    _pending: set[str] | None = None  # paths changed in the current batch
+
     def __init__(self, path: Path, file_ext: str = "json") -> None:
+        # Set before anything can raise, since __del__ closes the children
+        self.children: dict[str, Storage] = {}
         self.path = self.ensure_dir(path)
+        # Documents are addressed by plain string concatenation onto this prefix
+        self._prefix = os.fspath(self.path) + os.sep
         self.file_ext = file_ext
-        self.children: dict[str, Storage] = {}
+        self._suffix = f".{file_ext}"
+        # Canonical document names, specialized for this storage's extension
+        self._cn = partial(_with_suffix, self._suffix)
+
+    def __del__(self) -> None:
+        self.close()
 
     @staticmethod
     def ensure_dir(path: Path) -> Path:
         """Ensure the given path is a directory, creating it if necessary."""
-        if not path.exists():
+        try:
+            is_dir = stat.S_ISDIR(os.stat(path).st_mode)
+        except FileNotFoundError:
             path.mkdir(parents=True, exist_ok=True)
-        if path.is_dir():
+            return path
+        if is_dir:
             return path
         raise NotADirectoryError(f"{path} is not a directory")
 
     # Document management
 
-    def names(self) -> list[Path]:
-        """List all documents."""
-        return list(self.path.glob(f"*.{self.file_ext}"))
+    def names(self) -> list[str]:
+        """List the file names of all documents."""
+        suffix = self._suffix
+        with os.scandir(self.path) as entries:
+            return [entry.name for entry in entries if entry.name.endswith(suffix)]
+
+    def path_for(self, name: str) -> str:
+        """Get the filesystem path of a document."""
+        return self._prefix + self._cn(name)
+
+    def _at(self, file_name: str) -> tuple[str, int | None]:
+        """Resolve a file name against the storage directory's cached descriptor."""
+        if not _DIR_FD_SUPPORTED:
+            return self._prefix + file_name, None
+        if self._dirfd is None:
+            flags = os.O_RDONLY | os.O_DIRECTORY | os.O_CLOEXEC
+            self._dirfd = os.open(self.path, flags)
+        return file_name, self._dirfd
+
+    def _drop_stale_dirfd(self) -> bool:
+        """Close the cached descriptor if its directory has been removed."""
+        if self._dirfd is None or os.fstat(self._dirfd).st_nlink:
+            return False
+        os.close(self._dirfd)
+        self._dirfd = None
+        return True
+
+    def _at_call[R](self, op: Callable[[str, int | None], R], file_name: str) -> R:
+        """Run op on a file, retrying once if the directory was replaced meanwhile."""
+        try:
+            return op(*self._at(file_name))
+        except FileNotFoundError:
+            if not self._drop_stale_dirfd():
+                raise
+        return op(*self._at(file_name))
 
-    def read(self, name: str) -> str:
+    def stat(self, name: str) -> os.stat_result:
+        """Stat a document."""
+        return self._at_call(
+            lambda path, dir_fd: os.stat(path, dir_fd=dir_fd), self._cn(name)
+        )
+
+    def read(self, name: str) -> bytes:
         """Read a document."""
-        path = self.path / cn(name, self.file_ext)
-        with open(path, "r") as f:
-            return f.read()
-
-    def all(self) -> list[str]:  # FIXME: make this a generator
-        """Read all documents."""
-        items = []
-        for path in self.names():
-            with open(path, "r") as f:
-                items.append(f.read())
-        return items
-
-    def write(self, name: str, data: str) -> None:
+        return self._at_call(read_file, self._cn(name))
+
+    def all(self) -> Iterator[bytes]:
+        """Read all documents, one at a time."""
+        for name in self.names():
+            yield self._at_call(read_file, name)
+
+    def items(self) -> Iterator[tuple[str, bytes]]:
+        """Read all documents, yielding each name (without extension) and contents."""
+        suffix = self._suffix
+        for name in self.names():
+            yield name.removesuffix(suffix), self._at_call(read_file, name)
+
+    def all_parallel(self, workers: int = DEFAULT_READ_WORKERS) -> Iterator[bytes]:
+        """Read all documents, overlapping up to workers file reads on a shared pool."""
+        self._drop_stale_dirfd()
+        located = [self._at(name) for name in self.names()]
+        yield from _map_bounded(lambda at: read_file(*at), located, workers)
+
+    def write(self, name: str, data: bytes) -> None:
         """Write a document."""
-        path = self.path / cn(name, self.file_ext)
-        with open(path, "w") as f:
-            f.write(data)
+        self._at_call(
+            lambda path, dir_fd: write_file(path, data, dir_fd), self._cn(name)
+        )
+        if self._pending is not None:
+            self._pending.add(self._prefix + self._cn(name))
 
     def delete(self, name: str) -> None:
         """Delete a document."""
-        path = self.path / cn(name, self.file_ext)
-        if path.exists():
-            path.unlink()
+        try:
+            self._at_call(
+                lambda path, dir_fd: os.unlink(path, dir_fd=dir_fd), self._cn(name)
+            )
+        except FileNotFoundError:
+            pass
+        if self._pending is not None:
+            self._pending.add(self._prefix + self._cn(name))
+
+    # Durability
+
+    @contextmanager
+    def batch(self) -> Iterator["Storage"]:
+        """Group writes and deletes here and in child storages, syncing them on exit.
+
+        Nested batches join the outermost one, which does the sync. Batches
+        already open in child storages are folded in and resume afterwards.
+        """
+        if self._pending is not None:
+            yield self
+            return
+        inner = self._open_batches()
+        self._set_pending(set().union(*inner.values()))
+        try:
+            yield self
+        finally:
+            try:
+                self.flush()
+                for pending in inner.values():
+                    pending.clear()  # synced along with this batch
+            finally:
+                self._set_pending(None)
+                for child, pending in inner.items():
+                    child._set_pending(pending)
+
+    def flush(self) -> None:
+        """Sync the documents changed so far in the current batch to disk."""
+        if self._pending:
+            sync_files(sorted(self._pending))
+            self._pending.clear()
+
+    def _open_batches(self) -> dict["Storage", set[str]]:
+        """Map child storages with a batch open to their pending sets, parents first."""
+        batches = {}
+        for child in self.children.values():
+            if child._pending is not None:
+                batches[child] = child._pending
+            batches.update(child._open_batches())
+        return batches
+
+    def _set_pending(self, pending: set[str] | None) -> None:
+        self._pending = pending
+        for child in self.children.values():
+            child._set_pending(pending)
 
     # Storage management
 
     def remove_storage(self) -> None:
         """Remove the entire storage directory and its contents."""
+        self.close()
+        rmtree(self.path, ignore_errors=True)
+        self.children.clear()
+
+    def close(self) -> None:
+        """Release cached directory descriptors; they are reopened on next use."""
+        if self._dirfd is not None:
+            os.close(self._dirfd)
+            self._dirfd = None
         for child in self.children.values():
-            child.remove_storage()
-        self.children = {}
-        rmtree(self.path)
+            child.close()
 
     def add_child(self, name: str) -> "Storage":
         """Get or create a child storage."""
-        if name not in self.children.keys():
-            self.children[name] = Storage(self.path / name)
+        if name not in self.children:
+            child = self.children[name] = Storage(self.path / name)
+            child._pending = self._pending
         return self.children[name]
@@ -0,0 +1,158 @@
+from operator import attrgetter
+from typing import Annotated
+from unittest import TestCase
+
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    PlainSerializer,
+    field_serializer,
+    field_validator,
+)
+
+from src.nondb.KeyExpr import compile_expr, key_getter, raw_key_getter
+
+
+class Address(BaseModel):
+    city: str
+
+
+class TestModel(BaseModel):
+    id: int
+    address: Address
+    metadata: dict
+    secret: str = Field(default="hidden", exclude=True)
+
+
+class SerializedModel(BaseModel):
+    id: int
+    code: str = Field(serialization_alias="CODE")
+    label: str
+
+    @field_serializer("label")
+    def upper_label(self, value: str) -> str:
+        return value.upper()
+
+
+class AnnotatedModel(BaseModel):
+    id: int
+    group: Annotated[int, PlainSerializer(lambda value: value * 10)]
+    address: Address
+    nickname: str | None = None
+
+
+class FlagModel(BaseModel):
+    id: int
+    active: bool
+
+
+class ValidatedModel(BaseModel):
+    model_config = ConfigDict(str_to_lower=True)
+
+    id: int
+    name: str
+    code: str
+
+    @field_validator("id")
+    @classmethod
+    def positive_id(cls, value: int) -> int:
+        return abs(value)
+
+
+class TestKeyExpr(TestCase):
+    def setUp(self):
+        self.record = TestModel(
+            id=7, address=Address(city="Oslo"), metadata={"key": "abc"}
+        )
+
+    def test_compile_expr_is_memoized(self):
+        """Test that compiling the same expression returns the cached result."""
+        first = compile_expr("metadata.key")
+        second = compile_expr("metadata.key")
+
+        self.assertIs(first, second)
+        self.assertEqual(first.expression, "metadata.key")
+        self.assertEqual(first.search({"metadata": {"key": "abc"}}), "abc")
+
+    def test_key_getter_simple_field(self):
+        """Test that plain field names use attribute access."""
+        getter = key_getter(TestModel, "id")
+
+        self.assertIsInstance(getter, attrgetter)
+        self.assertEqual(getter(self.record), 7)
+
+    def test_key_getter_nested_model(self):
+        """Test that dotted paths through nested models use attribute access."""
+        getter = key_getter(TestModel, "address.city")
+
+        self.assertIsInstance(getter, attrgetter)
+        self.assertEqual(getter(self.record), "Oslo")
+
+    def test_key_getter_is_shared_per_schema(self):
+        """Test that getters are reused for the same schema and expression."""
+        self.assertIs(key_getter(TestModel, "id"), key_getter(TestModel, "id"))
+        self.assertIs(
+            key_getter(TestModel, "metadata.key"), key_getter(TestModel, "metadata.key")
+        )
+        self.assertIsNot(key_getter(TestModel, "id"), key_getter(SerializedModel, "id"))
+
+    def test_key_getter_falls_back_to_jmespath(self):
+        """Test that paths outside declared model fields are searched with JMESPath."""
+        for expr, expected in [
+            ("metadata.key", "abc"),
+            ("missing", None),
+            ("secret", None),
+            ("[id, address.city]", [7, "Oslo"]),
+        ]:
+            getter = key_getter(TestModel, expr)
+            self.assertNotIsInstance(getter, attrgetter)
+            self.assertEqual(getter(self.record), expected)
+
+    def test_key_getter_respects_serializers(self):
+        """Test that fields with custom serialization are searched on model_dump()."""
+        record = AnnotatedModel(id=1, group=2, address=Address(city="Oslo"))
+        for schema, expr, source, expected in [
+            (AnnotatedModel, "group", record, 20),
+            (AnnotatedModel, "address", record, {"city": "Oslo"}),
+            (SerializedModel, "label", SerializedModel(id=1, code="c", label="x"), "X"),
+        ]:
+            getter = key_getter(schema, expr)
+            self.assertNotIsInstance(getter, attrgetter)
+            self.assertEqual(getter(source), expected)
+
+        self.assertIsInstance(key_getter(AnnotatedModel, "nickname"), attrgetter)
+        self.assertIsNone(raw_key_getter(AnnotatedModel, "group"))
+
+    def test_raw_key_getter_reads_json_data(self):
+        """Test that plain scalar paths are read from parsed JSON."""
+        data = self.record.model_dump(mode="json")
+
+        self.assertEqual(raw_key_getter(TestModel, "id")(data), 7)
+        self.assertEqual(raw_key_getter(TestModel, "address.city")(data), "Oslo")
+
+    def test_raw_key_getter_unavailable(self):
+        """Test that paths whose JSON form may differ from the model are refused."""
+        self.assertIsNone(raw_key_getter(TestModel, "address"))
+        self.assertIsNone(raw_key_getter(TestModel, "metadata.key"))
+        self.assertIsNone(raw_key_getter(SerializedModel, "code"))
+        self.assertIsNone(raw_key_getter(SerializedModel, "label"))
+        self.assertIsNotNone(raw_key_getter(SerializedModel, "id"))
+        self.assertIsNone(raw_key_getter(ValidatedModel, "id"))
+        self.assertIsNone(raw_key_getter(ValidatedModel, "name"))
+
+    def test_raw_key_getter_rejects_lax_values(self):
+        """Test that JSON values validation would coerce raise TypeError."""
+        get_id = raw_key_getter(TestModel, "id")
+        get_active = raw_key_getter(FlagModel, "active")
+
+        for getter, data in [
+            (get_id, {"id": 5.0}),
+            (get_id, {"id": "5"}),
+            (get_id, {"id": True}),
+            (get_active, {"active": 1}),
+            (get_active, {"active": "true"}),
+        ]:
+            with self.assertRaises(TypeError):
+                getter(data)
+        self.assertIs(get_active({"active": True}), True)
@@ -1,9 +1,10 @@
 import tempfile
 from pathlib import Path
 from shutil import rmtree
+from typing import Annotated
 from unittest import TestCase
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PlainSerializer
 
 from src.nondb.NonIndex import NonIndex
 from src.nondb.NonTable import NonTable
@@ -16,6 +17,17 @@ class TestModel(BaseModel):
     category: str
 
 
+class TaggedModel(BaseModel):
+    id: int
+    category: str
+    tags: list[str]
+
+
+class GroupedModel(BaseModel):
+    id: int
+    group: Annotated[str, PlainSerializer(str.upper)]
+
+
 class TestNoIndex(TestCase):
     def setUp(self):
         """Set up a temporary directory and test data for each test."""
@@ -80,6 +92,70 @@ class TestNoIndex(TestCase):
         new_symlink = self.index.storage.path / "user" / "1.json"
         self.assertTrue(new_symlink.exists())
 
+    def test_update_with_unchanged_key_keeps_symlink(self):
+        """Test that re-indexing a record under the same key leaves one symlink."""
+        self.index.put(self.record1)
+
+        updated_record = TestModel(id=1, name="Alice Updated", category="admin")
+        self.table.save(updated_record)
+        self.index.put(updated_record)
+
+        symlink_path = self.index.storage.path / "admin" / "1.json"
+        self.assertTrue(symlink_path.is_symlink())
+        self.assertEqual(self.index.get("admin")[0].name, "Alice Updated")
+
+    def test_update_recreates_removed_key_directory(self):
+        """Test that a key whose directory was emptied can be indexed again."""
+        self.index.put(self.record1)
+        self.index.put(TestModel(id=1, name="Alice", category="user"))
+        self.assertFalse((self.index.storage.path / "admin").exists())
+
+        self.index.put(self.record3)
+
+        symlink_path = self.index.storage.path / "admin" / "3.json"
+        self.assertTrue(symlink_path.is_symlink())
+
+    def test_update_existing_index_from_new_instance(self):
+        """Test that a fresh index instance finds links written by another one."""
+        self.index.rebuild_index()
+
+        reopened = NonIndex(self.table, TestModel, "category")
+        reopened.put(TestModel(id=1, name="Alice", category="user"))
+
+        self.assertFalse((reopened.storage.path / "admin" / "1.json").exists())
+        self.assertTrue((reopened.storage.path / "user" / "1.json").is_symlink())
+
+    def test_update_from_two_handles(self):
+        """Test that a stale handle still moves the record's only index link."""
+        other_table = NonTable(self.storage, TestModel, "id")
+        other_index = NonIndex(other_table, TestModel, "category")
+        self.index.rebuild_index()
+
+        self.table.save(self.record1)
+        self.index.put(self.record1)
+        moved = TestModel(id=1, name="Alice", category="user")
+        other_table.save(moved)
+        other_index.put(moved)
+        guest = TestModel(id=1, name="Alice", category="guest")
+        self.table.save(guest)
+        self.index.put(guest)
+
+        self.assertNotIn("1", self.index.keys("admin"))
+        self.assertNotIn("1", self.index.keys("user"))
+        self.assertEqual(self.index.keys("guest"), ["1"])
+
+    def test_delete_from_stale_handle(self):
+        """Test that deleting through a stale handle removes the current link."""
+        self.index.rebuild_index()
+        other_index = NonIndex(self.table, TestModel, "category")
+        other_index._reverse_map()
+        self.index.put(TestModel(id=1, name="Alice", category="user"))
+
+        other_index.delete(self.record1)
+
+        self.assertNotIn("1", self.index.keys("admin"))
+        self.assertNotIn("1", self.index.keys("user"))
+
     def test_rebuild_index(self):
         """Test rebuilding the entire index."""
         self.index.rebuild_index()
@@ -99,6 +175,47 @@ class TestNoIndex(TestCase):
         user_files = list(user_dir.glob("*.json"))
         self.assertEqual(len(user_files), 1)
 
+    def test_rebuild_index_fills_missing_fields_from_defaults(self):
+        """Test rebuilding when a stored document omits a defaulted index field."""
+
+        class TaggedModel(BaseModel):
+            id: int
+            tag: str = "untagged"
+
+        table = NonTable(self.storage, TaggedModel, "id")
+        table.save(TaggedModel(id=1, tag="red"))
+        table.storage.write("2", b'{"id": 2}')
+
+        index = NonIndex(table, TaggedModel, "tag")
+        index.rebuild_index()
+
+        self.assertEqual([record.id for record in index.get("red")], [1])
+        self.assertEqual([record.id for record in index.get("untagged")], [2])
+
+    def test_rebuild_index_matches_save_for_serialized_field(self):
+        """Test that save and rebuild index a serialized field under the same key."""
+        table = NonTable(self.storage, GroupedModel, "id")
+        index = table.index("group")
+        table.save(GroupedModel(id=1, group="red"))
+        saved = {key: index.keys(key) for key in index._index_keys()}
+
+        index.rebuild_index()
+        rebuilt = {key: index.keys(key) for key in index._index_keys()}
+
+        self.assertEqual(saved, {"RED": ["1"]})
+        self.assertEqual(rebuilt, saved)
+
+    def test_rebuild_index_coerces_lax_json(self):
+        """Test rebuilding when a stored value only matches its field after coercion."""
+        self.table.storage.write("5", b'{"id": 5.0, "name": "Eve", "category": "user"}')
+        index = NonIndex(self.table, TestModel, "id")
+
+        index.rebuild_index()
+
+        self.assertEqual(index.keys("5"), ["5"])
+        self.assertEqual([record.name for record in index.get("5")], ["Eve"])
+        self.assertNotIn("5.0", index._index_keys())
+
     def test_get_records_by_index_key(self):
         """Test retrieving records by index key."""
         self.index.rebuild_index()
@@ -114,6 +231,35 @@ class TestNoIndex(TestCase):
         self.assertEqual(len(user_records), 1)
         self.assertEqual(user_records[0].id, 2)
 
+    def test_get_isolates_nested_values(self):
+        """Test that nested values on records from get() are not shared."""
+        table = NonTable(self.storage, TaggedModel, "id")
+        index = table.index("category")
+        table.save(TaggedModel(id=1, category="admin", tags=["x"]))
+
+        index.get("admin")[0].tags.append("LEAK")
+
+        self.assertEqual(index.get("admin")[0].tags, ["x"])
+        self.assertEqual(table.fetch("1").tags, ["x"])
+
+    def test_put_key_shares_dump(self):
+        """Test that put_key reuses and returns the record dump it was given."""
+        computed = NonIndex(self.table, TestModel, "join('-', [category, name])")
+        dumped = self.record1.model_dump()
+
+        self.assertIs(computed.put_key("1", self.record1, dumped), dumped)
+        self.assertIsNone(self.index.put_key("1", self.record1))
+        self.assertEqual(computed.keys("admin-Alice"), ["1"])
+        self.assertEqual(self.index.keys("admin"), ["1"])
+
+    def test_keys_by_index_key(self):
+        """Test listing primary keys by index key without loading records."""
+        self.index.rebuild_index()
+
+        self.assertEqual(set(self.index.keys("admin")), {"1", "3"})
+        self.assertEqual(self.index.keys("user"), ["2"])
+        self.assertEqual(self.index.keys("nonexistent"), [])
+
     def test_get_nonexistent_key(self):
         """Test getting records for non-existent key."""
         self.index.rebuild_index()
@@ -136,6 +282,16 @@ class TestNoIndex(TestCase):
         self.assertEqual(len(admin_records), 1)
         self.assertEqual(admin_records[0].id, 3)
 
+    def test_remove_record_after_file_deleted(self):
+        """Test removing a record whose table file is already gone."""
+        self.index.rebuild_index()
+        (self.table.storage.path / "2.json").unlink()
+
+        self.index.delete(self.record2)
+
+        self.assertFalse((self.index.storage.path / "user" / "2.json").is_symlink())
+        self.assertFalse((self.index.storage.path / "user").exists())
+
     def test_vacuum_removes_broken_symlinks(self):
         """Test that vacuum removes broken symlinks and empty directories."""
         self.index.rebuild_index()
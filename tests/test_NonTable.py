@@ -1,9 +1,11 @@
 import tempfile
+from collections.abc import Iterator
+from operator import attrgetter
 from pathlib import Path
 from shutil import rmtree
 from unittest import TestCase
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_serializer
 
 from src.nondb.NonTable import NonTable
 from src.nondb.Storage import Storage
@@ -15,6 +17,20 @@ class TestModel(BaseModel):
     email: str
 
 
+class TaggedModel(BaseModel):
+    id: str
+    tags: list[str]
+
+
+class CodedModel(BaseModel):
+    id: str
+    name: str
+
+    @field_serializer("id")
+    def upper_id(self, value: str) -> str:
+        return value.upper()
+
+
 class PersonModel(BaseModel):
     id: str
     first_name: str
@@ -23,17 +39,27 @@ class PersonModel(BaseModel):
 
 
 class TestNoTable(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Create one temporary root shared by every test in the class."""
+        cls.temp_root = Path(tempfile.mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the shared temporary root."""
+        rmtree(cls.temp_root, ignore_errors=True)
+
     def setUp(self):
         """Set up a temporary directory for each test."""
-        self.temp_dir = tempfile.mkdtemp()
-        self.storage_path = Path(self.temp_dir) / "test_storage"
+        self.temp_dir = self.temp_root / self._testMethodName
+        self.temp_dir.mkdir()
+        self.storage_path = self.temp_dir / "test_storage"
         self.storage = Storage(self.storage_path)
         self.table = NonTable(self.storage, TestModel, "id")
 
     def tearDown(self):
         """Clean up after each test."""
-        if self.storage_path.exists():
-            rmtree(self.storage_path)
+        rmtree(self.temp_dir, ignore_errors=True)
 
     def test_init(self):
         """Test NoTable initialization."""
@@ -74,6 +100,27 @@ class TestNoTable(TestCase):
         nested_key = nested_table.key_for(person_record)
         self.assertEqual(nested_key, "Jane")
 
+    def test_key_for_identifier_reads_attribute(self):
+        """Test that identifier keys are read straight off the record."""
+        table = NonTable(self.storage, PersonModel, "first_name")
+        self.assertIsInstance(table._key_fn, attrgetter)
+
+        computed = NonTable(
+            self.storage, PersonModel, "join('-', [first_name, last_name])"
+        )
+        self.assertNotIsInstance(computed._key_fn, attrgetter)
+        record = PersonModel(id="abc123", first_name="Jane", last_name="Smith", age=30)
+        self.assertEqual(computed.key_for(record), "Jane-Smith")
+
+    def test_key_for_applies_field_serializer(self):
+        """Test that keys come from the serialized form of the key field."""
+        table = NonTable(self.storage, CodedModel, "id")
+        table.save(CodedModel(id="abc", name="Coded"))
+
+        self.assertEqual(table.key_for(CodedModel(id="abc", name="Coded")), "ABC")
+        self.assertEqual(table.keys(), ["ABC"])
+        self.assertEqual(table.fetch("ABC").name, "Coded")
+
     def test_save_and_fetch(self):
         """Test saving and fetching records."""
         record = TestModel(id=123, name="John Doe", email="john@example.com")
@@ -91,6 +138,54 @@ class TestNoTable(TestCase):
         self.assertEqual(fetched_record.name, "John Doe")
         self.assertEqual(fetched_record.email, "john@example.com")
 
+    def test_fetch_reuses_cached_document(self):
+        """Test that repeated fetches of an unchanged file hand out separate records."""
+        self.table.save(TestModel(id=1, name="Alice", email="alice@example.com"))
+
+        first = self.table.fetch("1")
+        first.name = "Changed locally"
+        second = self.table.fetch("1")
+
+        self.assertIsNot(first, second)
+        self.assertEqual(second.name, "Alice")
+        self.assertEqual(len(self.table._cache), 1)
+
+    def test_fetch_isolates_nested_values(self):
+        """Test that nested values on a fetched record are not shared with the cache."""
+        table = NonTable(self.storage, TaggedModel, "id")
+        table.save(TaggedModel(id="a", tags=["x"]))
+
+        table.fetch("a").tags.append("LEAK")
+
+        self.assertEqual(table.fetch("a").tags, ["x"])
+
+    def test_fetch_cache_is_bounded(self):
+        """Test that the fetch cache evicts the least recently used record."""
+        self.table.cache_size = 2
+        for i in range(3):
+            self.table.save(TestModel(id=i, name=f"User {i}", email=f"{i}@example.com"))
+
+        self.table.fetch("0")
+        self.table.fetch("1")
+        self.table.fetch("0")
+        self.table.fetch("2")
+
+        cached_paths = list(self.table._cache)
+        self.assertEqual(
+            cached_paths,
+            [self.table.storage.path_for("0"), self.table.storage.path_for("2")],
+        )
+
+    def test_fetch_sees_external_changes(self):
+        """Test that fetch re-reads a record whose file changed on disk."""
+        self.table.save(TestModel(id=1, name="Alice", email="alice@example.com"))
+        self.assertEqual(self.table.fetch("1").name, "Alice")
+
+        other_table = NonTable(self.storage, TestModel, "id")
+        other_table.save(TestModel(id=1, name="Alicia", email="alicia@example.com"))
+
+        self.assertEqual(self.table.fetch("1").name, "Alicia")
+
     def test_fetch_nonexistent_record(self):
         """Test fetching a non-existent record raises appropriate error."""
         with self.assertRaises(FileNotFoundError):
@@ -119,6 +214,45 @@ class TestNoTable(TestCase):
         ids = {record.id for record in all_records}
         self.assertEqual(ids, {1, 2, 3})
 
+    def test_iter_all(self):
+        """Test that iter_all streams records lazily."""
+        self.table.save(TestModel(id=1, name="Alice", email="alice@example.com"))
+        self.table.save(TestModel(id=2, name="Bob", email="bob@example.com"))
+
+        records = self.table.iter_all()
+        self.assertIsInstance(records, Iterator)
+        self.assertEqual({record.id for record in records}, {1, 2})
+
+    def test_all_reuses_cached_records(self):
+        """Test that all() serves unchanged records from the fetch cache."""
+        self.table.save(TestModel(id=1, name="Alice", email="alice@example.com"))
+        self.table.save(TestModel(id=2, name="Bob", email="bob@example.com"))
+        self.table.all()
+        self.assertEqual(len(self.table._cache), 2)
+
+        self.table.save(TestModel(id=2, name="Bobby", email="bob@example.com"))
+
+        names = {record.name for record in self.table.all()}
+        self.assertEqual(names, {"Alice", "Bobby"})
+
+    def test_all_isolates_nested_values(self):
+        """Test that nested values on records from all() are not shared."""
+        table = NonTable(self.storage, TaggedModel, "id")
+        table.save(TaggedModel(id="a", tags=["x"]))
+
+        table.all()[0].tags.append("LEAK")
+
+        self.assertEqual(table.all()[0].tags, ["x"])
+        self.assertEqual(table.fetch("a").tags, ["x"])
+
+    def test_all_with_workers(self):
+        """Test retrieving all records with parallel reads."""
+        for i in range(10):
+            self.table.save(TestModel(id=i, name=f"User {i}", email=f"{i}@example.com"))
+
+        all_records = self.table.all(workers=4)
+        self.assertEqual({record.id for record in all_records}, set(range(10)))
+
     def test_keys(self):
         """Test retrieving all keys from table."""
         # Initially empty
@@ -136,6 +270,25 @@ class TestNoTable(TestCase):
         keys = self.table.keys()
         self.assertEqual(set(keys), {"100", "200"})
 
+    def test_save_many(self):
+        """Test saving several records at once updates files and indices."""
+        name_index = self.table.index("name")
+        self.table.save(TestModel(id=1, name="Alice", email="alice@example.com"))
+        self.table.fetch("1")
+
+        self.table.save_many(
+            [
+                TestModel(id=1, name="Alicia", email="alicia@example.com"),
+                TestModel(id=2, name="Bob", email="bob@example.com"),
+            ]
+        )
+
+        self.assertEqual(set(self.table.keys()), {"1", "2"})
+        self.assertEqual(self.table.fetch("1").name, "Alicia")
+        self.assertEqual(name_index.get("Alice"), [])
+        self.assertEqual([record.id for record in name_index.get("Alicia")], [1])
+        self.assertEqual([record.id for record in name_index.get("Bob")], [2])
+
     def test_delete(self):
         """Test deleting records."""
         record = TestModel(id=456, name="Test User", email="test@example.com")
@@ -222,6 +375,16 @@ class TestNoTable(TestCase):
         # Verify indices were updated (this tests the integration)
         self.assertEqual(len(self.table._indices), 2)
 
+    def test_save_updates_expression_indices(self):
+        """Test that saving updates attribute and JMESPath indices together."""
+        name_index = self.table.index("name")
+        pair_index = self.table.index("join('-', [name, email])")
+
+        self.table.save(TestModel(id=1, name="Alice", email="alice@example.com"))
+
+        self.assertEqual(name_index.keys("Alice"), ["1"])
+        self.assertEqual(pair_index.keys("Alice-alice@example.com"), ["1"])
+
     def test_delete_removes_from_indices(self):
         """Test that deleting records removes them from all indices."""
         # Create indices
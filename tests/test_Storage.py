@@ -1,60 +1,252 @@
+import gc
+import os
+import sys
 import tempfile
+import threading
+import time
 from pathlib import Path
 from shutil import rmtree
-from unittest import TestCase
+from unittest import TestCase, mock, skipUnless
 
-from src.nondb.Storage import Storage, cn
+from src.nondb.Storage import (
+    Storage,
+    _map_bounded,
+    _read_pool,
+    cn,
+    read_file,
+    sync_files,
+    write_file,
+)
 
 
 class TestStorage(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        """Create one temporary root shared by every test in the class."""
+        cls.temp_root = Path(tempfile.mkdtemp())
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the shared temporary root."""
+        rmtree(cls.temp_root, ignore_errors=True)
+
     def setUp(self):
         """Set up a temporary directory for each test."""
-        self.temp_dir = tempfile.mkdtemp()
-        self.storage_path = Path(self.temp_dir) / "test_storage"
+        self.temp_dir = self.temp_root / self._testMethodName
+        self.temp_dir.mkdir()
+        self.storage_path = self.temp_dir / "test_storage"
         self.storage = Storage(self.storage_path)
 
     def tearDown(self):
         """Clean up after each test."""
-        if self.storage_path.exists():
-            rmtree(self.storage_path)
+        rmtree(self.temp_dir, ignore_errors=True)
 
     def test_write_and_read(self):
         # Test writing to and then reading from a document.
-        self.storage.write("test", "data")
+        self.storage.write("test", b"data")
         read_data = self.storage.read("test")
-        self.assertEqual(read_data, "data")
+        self.assertEqual(read_data, b"data")
+
+    def test_read_file(self):
+        # Test that read_file returns the full contents of small and large files.
+        for size in (0, 10, 1 << 20):
+            data = os.urandom(size)
+            self.storage.write("blob", data)
+            self.assertEqual(read_file(str(self.storage.path / "blob.json")), data)
+
+    def test_write_file_truncates(self):
+        # Test that write_file replaces longer existing contents.
+        path = str(self.storage.path / "doc.json")
+        write_file(path, b"a much longer document")
+        write_file(path, b"short")
+        self.assertEqual(read_file(path), b"short")
+
+    def test_write_replaces_file(self):
+        # Test that writes swap in a new file and leave no temporary files behind.
+        self.storage.write("doc", b"old")
+        old_inode = self.storage.stat("doc").st_ino
+        self.storage.write("doc", b"new")
+        self.assertNotEqual(self.storage.stat("doc").st_ino, old_inode)
+        self.assertEqual(self.storage.read("doc"), b"new")
+        self.assertEqual(os.listdir(self.storage.path), ["doc.json"])
 
     def test_names_and_all(self):
         # Test that names returns correct file paths and all returns document contents.
-        self.storage.write("first", "data1")
-        self.storage.write("second", "data2")
+        self.storage.write("first", b"data1")
+        self.storage.write("second", b"data2")
         names = self.storage.names()
         self.assertEqual(len(names), 2)
-        contents = self.storage.all()
-        self.assertIn("data1", contents)
-        self.assertIn("data2", contents)
+        self.assertEqual(set(names), {"first.json", "second.json"})
+        contents = list(self.storage.all())
+        self.assertIn(b"data1", contents)
+        self.assertIn(b"data2", contents)
+
+    def test_all_parallel(self):
+        # Test that all_parallel returns the same documents as all.
+        for i in range(20):
+            self.storage.write(f"doc{i}", f"data{i}".encode())
+        self.assertEqual(
+            sorted(self.storage.all_parallel(workers=4)), sorted(self.storage.all())
+        )
+        self.assertEqual(
+            sorted(self.storage.all_parallel()), sorted(self.storage.all())
+        )
+        self.assertIs(_read_pool(), _read_pool())
+
+    def test_map_bounded(self):
+        # Test that bounded maps keep order and never exceed their limit.
+        lock = threading.Lock()
+        running, peak = 0, 0
+
+        def work(item):
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.001)
+            with lock:
+                running -= 1
+            return item * 2
+
+        self.assertEqual(list(_map_bounded(work, range(20), 3)), list(range(0, 40, 2)))
+        self.assertLessEqual(peak, 3)
 
     def test_child_storage(self):
         # Test creating a child storage, then writing and reading within it.
         child_storage = self.storage.add_child("child1")
-        child_storage.write("child_file", "child_data")
+        child_storage.write("child_file", b"child_data")
         read_child = child_storage.read("child_file")
-        self.assertEqual(read_child, "child_data")
+        self.assertEqual(read_child, b"child_data")
         self.assertTrue(child_storage.path.exists())
 
     def test_delete(self):
         # Test deleting a document.
-        self.storage.write("to_delete", "delete_me")
+        self.storage.write("to_delete", b"delete_me")
         file_path = self.storage.path / "to_delete.json"
         self.assertTrue(file_path.exists())
         self.storage.delete("to_delete")
         self.assertFalse(file_path.exists())
 
+    def test_path_for(self):
+        # Test that document paths are plain strings inside the storage directory.
+        path = self.storage.path_for("doc")
+        self.assertIsInstance(path, str)
+        self.assertEqual(path, str(self.storage_path / "doc.json"))
+        self.assertEqual(self.storage.path_for("doc.json"), path)
+
+    def test_stat_and_close(self):
+        # Test that documents stay reachable after the directory handle is closed.
+        self.storage.write("doc", b"12345")
+        self.assertEqual(self.storage.stat("doc").st_size, 5)
+        self.storage.close()
+        self.assertEqual(self.storage.read("doc"), b"12345")
+        self.storage.close()
+        self.storage.close()
+
+    @skipUnless(sys.platform.startswith("linux"), "dir_fd support is platform specific")
+    def test_uses_directory_descriptor(self):
+        # Test that documents are accessed relative to a cached directory descriptor.
+        self.storage.write("doc", b"old")
+        self.storage.read("doc")
+        self.assertIsNotNone(self.storage._dirfd)
+        self.storage.write("doc", b"new")
+        self.assertEqual(self.storage.read("doc"), b"new")
+        self.assertEqual(os.listdir(self.storage.path), ["doc.json"])
+
+    def test_directory_recreated_under_open_storage(self):
+        # Test that a storage keeps working after its directory is replaced.
+        self.storage.write("doc", b"old")
+        self.assertEqual(self.storage.read("doc"), b"old")
+        rmtree(self.storage_path)
+        self.storage_path.mkdir()
+
+        self.storage.write("doc", b"new")
+        self.assertEqual(self.storage.read("doc"), b"new")
+        self.assertEqual(self.storage.stat("doc").st_size, 3)
+        self.assertEqual(list(self.storage.all_parallel(workers=2)), [b"new"])
+        self.storage.delete("doc")
+        with self.assertRaises(FileNotFoundError):
+            self.storage.read("doc")
+
+    def test_batch(self):
+        # Test that a batch tracks changes in the storage and its children until exit.
+        child = self.storage.add_child("child")
+        with self.storage.batch() as storage:
+            storage.write("doc", b"data")
+            child.write("nested", b"data")
+            with child.batch():
+                child.delete("gone")
+            late_child = self.storage.add_child("late")
+            late_child.write("doc", b"data")
+            self.assertEqual(
+                self.storage._pending,
+                {
+                    self.storage.path_for("doc"),
+                    child.path_for("nested"),
+                    child.path_for("gone"),
+                    late_child.path_for("doc"),
+                },
+            )
+            self.storage.flush()
+            self.assertEqual(self.storage._pending, set())
+        self.assertIsNone(self.storage._pending)
+        self.assertIsNone(child._pending)
+        self.storage.write("after", b"data")
+        self.assertIsNone(self.storage._pending)
+        self.assertEqual(self.storage.read("doc"), b"data")
+
+    def test_batch_around_open_child_batch(self):
+        # Test that a parent batch opened inside a child's batch keeps tracking both.
+        child = self.storage.add_child("child")
+        with child.batch():
+            child.write("one", b"data")
+            with self.storage.batch():
+                self.storage.write("two", b"data")
+                self.assertEqual(
+                    self.storage._pending,
+                    {child.path_for("one"), self.storage.path_for("two")},
+                )
+                self.assertIs(child._pending, self.storage._pending)
+            self.assertIsNone(self.storage._pending)
+            self.assertEqual(child._pending, set())
+            child.write("three", b"data")
+            self.assertEqual(child._pending, {child.path_for("three")})
+        self.assertIsNone(child._pending)
+
+    def test_sync_files(self):
+        # Test that each file and each directory is synced once, skipping missing files.
+        child = self.storage.add_child("child")
+        self.storage.write("doc", b"data")
+        child.write("nested", b"data")
+        real_fsync = os.fsync
+        synced = []
+
+        def record_fsync(fd):
+            synced.append(os.fstat(fd).st_ino)
+            real_fsync(fd)
+
+        with mock.patch("os.fsync", side_effect=record_fsync):
+            sync_files(
+                [
+                    self.storage.path_for("doc"),
+                    self.storage.path_for("missing"),
+                    child.path_for("nested"),
+                ]
+            )
+
+        expected = [
+            self.storage.stat("doc").st_ino,
+            child.stat("nested").st_ino,
+            os.stat(self.storage.path).st_ino,
+            os.stat(child.path).st_ino,
+        ]
+        self.assertEqual(sorted(synced), sorted(expected))
+
     def test_remove_storage(self):
         # Test recursive removal of storage including child directories.
-        self.storage.write("file", "value")
+        self.storage.write("file", b"value")
         child_storage = self.storage.add_child("sub")
-        child_storage.write("child_file", "child_value")
+        child_storage.write("child_file", b"child_value")
         self.assertTrue(self.storage.path.exists())
         self.assertTrue(child_storage.path.exists())
         self.storage.remove_storage()
@@ -83,3 +275,18 @@ class TestStorage(TestCase):
             Storage.ensure_dir(file_path)
 
         self.assertIn("is not a directory", str(context.exception))
+
+    def test_init_with_file_path(self):
+        # Test that a Storage that fails to initialize is discarded cleanly
+        file_path = Path(self.temp_dir) / "not_a_directory.txt"
+        file_path.touch()
+        unraisable = []
+        previous_hook = sys.unraisablehook
+        sys.unraisablehook = unraisable.append
+        try:
+            with self.assertRaises(NotADirectoryError):
+                Storage(file_path)
+            gc.collect()
+        finally:
+            sys.unraisablehook = previous_hook
+        self.assertEqual(unraisable, [])